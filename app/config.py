@@ -1,3 +1,5 @@
+import os
+
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -23,8 +25,38 @@ class Settings(BaseSettings):
     output_dir: str = "outputs"
     database_url: str = "sqlite:///data/aipod.db"
 
+    # Language identification (fastText lid.176, provisioned ahead of time — see README; langdetect fallback)
+    langid_model_path: str = "data/lid.176.ftz"
+
+    # Machine translation
+    translate_concurrency: int = 8  # Max in-flight Google Translate requests per job
+
+    # LLM polishing
+    llm_concurrency: int = 16  # Max in-flight LLM requests per job
+    polish_batch_size: int = 20  # Segments polished per LLM request
+    llm_cache_ttl_hours: int = 720  # Reuse identical LLM responses for 30 days (0 = disabled)
+
+    # Speech generation
+    elevenlabs_concurrency: int = 4  # Max in-flight ElevenLabs TTS requests per job (one per voice at a time)
+
+    # Source separation
+    # Reuse stems for identical input audio, e.g. "data/separation_cache" ("" = disabled).
+    # No eviction: ~1.3 GB per hour of audio, and the hardlinks outlive deleted jobs
+    separation_cache_dir: str = ""
+
+    # Diarization
+    diarization_keep_loaded: bool = True  # False frees pyannote before Whisper loads (low-RAM hosts)
+    parallel_transcription: bool = True  # Whisper decodes while pyannote runs (needs RAM for both models)
+
     # Whisper
     whisper_model: str = "large-v3"  # Options: tiny, base, small, medium, large-v3
+    whisper_compute_type: str = "int8"  # e.g. int8_float16 on Apple Silicon
+    whisper_cpu_threads: int = 0  # 0 = this worker process's share of the cores
+    whisper_beam_size: int = 5  # 1 = greedy decoding (several times faster, slightly higher WER)
+    whisper_batch_size: int = 8  # VAD chunks decoded per batch (1 = sequential long-form decoding)
+
+    # Worker
+    celery_concurrency: int = 1  # Worker processes; CPU cores are split evenly between them
 
     # Auth
     admin_email: str = "admin@aipod.local"
@@ -37,6 +69,22 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+
+def cpu_threads_per_worker() -> int:
+    """Cores available to each Celery worker process, so N workers running
+    Whisper/torch don't each spin up a thread per core."""
+    return max(1, (os.cpu_count() or 1) // max(1, settings.celery_concurrency))
+
+
+def diarization_cpu_threads() -> int:
+    """Torch threads for pyannote. With parallel_transcription it runs next to
+    Whisper (which keeps the worker's full share, since it decodes for far
+    longer), so pyannote is capped to half of it."""
+    share = cpu_threads_per_worker()
+    if not settings.parallel_transcription:
+        return share
+    return max(1, share // 2)
+
 # --- Supported Languages (single source of truth) ---
 # Codes match Google Translate (used by deep-translator)
 SUPPORTED_LANGUAGES = [
@@ -68,6 +68,12 @@ def _migrate_db():
         if "audio_duration_seconds" not in existing_cols:
             cursor.execute("ALTER TABLE jobs ADD COLUMN audio_duration_seconds INTEGER")
 
+        # Add new SpeakerProfile columns if missing
+        cursor.execute("PRAGMA table_info(speaker_profiles)")
+        profile_cols = {row[1] for row in cursor.fetchall()}
+        if "embedding_blob" not in profile_cols:
+            cursor.execute("ALTER TABLE speaker_profiles ADD COLUMN embedding_blob BLOB")
+
         conn.commit()
     finally:
         conn.close()
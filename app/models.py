@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, ForeignKey, LargeBinary
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -99,6 +99,7 @@ class Job(Base):
             "voice_map_json": self.voice_map_json,
             "output_file": self.output_file,
             "report_json": self.report_json,
+            "auphonic_production_id": self.auphonic_production_id,
             "enabled_stages_json": self.enabled_stages_json,
             "audio_duration_seconds": self.audio_duration_seconds,
             "error_message": self.error_message,
@@ -113,8 +114,17 @@ class SpeakerProfile(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String)  # "Speaker 1" or user-assigned
-    embedding_json = Column(Text)  # JSON: 256-dim resemblyzer vector
+    embedding_json = Column(Text, nullable=True)  # Legacy JSON vector (profiles created before embedding_blob)
+    embedding_blob = Column(LargeBinary, nullable=True)  # 256-dim resemblyzer vector as raw float32 (1 KB)
     elevenlabs_voice_id = Column(String)  # Cached ElevenLabs voice ID
     sample_file = Column(Text)  # Path to audio sample used for cloning
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    hash = Column(String, primary_key=True)  # SHA-256 of the LLM request
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -3,6 +3,7 @@ import json
 import logging
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
@@ -39,13 +40,25 @@ def _heartbeat(job_id: str, label: str, interval: int = 30):
         t.join(timeout=2)
 
 
+_thread_state = threading.local()
+
+# Runs diarization alongside Whisper (see settings.parallel_transcription)
+_diarization_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarization")
+
+# Serialises _log_stage's read-modify-write of stage_log across the main,
+# diarization and heartbeat threads
+_stage_log_lock = threading.Lock()
+
+
 def _run_async(coro):
-    """Run an async function from sync Celery task."""
-    loop = asyncio.new_event_loop()
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+    """Run an async function from sync Celery task.
+    Reuses one event loop per worker thread so shared async API clients
+    keep their connections alive between stages."""
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop.run_until_complete(coro)
 
 
 def _update_job(job_id: str, **kwargs):
@@ -73,20 +86,21 @@ def _get_job(job_id: str) -> dict:
 
 def _log_stage(job_id: str, message: str):
     """Append a timestamped log entry to the job's stage_log (visible in UI)."""
-    db = SessionLocal()
-    try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            return
-        existing = json.loads(job.stage_log) if job.stage_log else []
-        existing.append({
-            "ts": datetime.now(timezone.utc).strftime("%H:%M:%S"),
-            "msg": message,
-        })
-        job.stage_log = json.dumps(existing)
-        db.commit()
-    finally:
-        db.close()
+    with _stage_log_lock:
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if not job:
+                return
+            existing = json.loads(job.stage_log) if job.stage_log else []
+            existing.append({
+                "ts": datetime.now(timezone.utc).strftime("%H:%M:%S"),
+                "msg": message,
+            })
+            job.stage_log = json.dumps(existing)
+            db.commit()
+        finally:
+            db.close()
     logger.info(f"Job {job_id}: {message}")
 
 
@@ -94,6 +108,13 @@ def _log_stage(job_id: str, message: str):
 def run_pipeline(self, job_id: str, start_from: int = 1):
     """Run pipeline stages 1-7.
     start_from allows resuming from a specific stage."""
+    diarization_future = None
+    pipeline_failed = threading.Event()
+
+    def _on_diarization_done(future: Future):
+        if not pipeline_failed.is_set():
+            _log_diarization_result(job_id, future)
+
     try:
         # Clear any stale error and log from previous run
         _update_job(job_id, error_message=None, stage_log=None)
@@ -136,6 +157,10 @@ def run_pipeline(self, job_id: str, start_from: int = 1):
                     stage_2_source_separation(job_id)
                     _log_stage(job_id, "Stage 2 complete — vocals and background tracks ready")
 
+        job = _get_job(job_id)
+        transcript = job.get("transcript_json")
+        needs_transcript = start_from <= 4 and not (transcript and json.loads(transcript))
+
         # --- Stage 3: Speaker Diarization (optional) ---
         diarization_segments = None
         if start_from <= 3:
@@ -144,18 +169,18 @@ def run_pipeline(self, job_id: str, start_from: int = 1):
             else:
                 _update_job(job_id, current_stage=3, stage_name="Speaker Detection")
                 _log_stage(job_id, "Stage 3: Running speaker diarization...")
-                diarization_segments = stage_3_diarization(job_id)
-                if diarization_segments:
-                    speakers = set(s.get("speaker") for s in diarization_segments)
-                    _log_stage(job_id, f"Stage 3 complete — {len(speakers)} speakers, {len(diarization_segments)} segments")
+                if settings.parallel_transcription and needs_transcript:
+                    # Whisper (stage 4) decodes while this runs and waits for it before assigning speakers
+                    diarization_future = _diarization_executor.submit(stage_3_diarization, job_id)
+                    diarization_future.add_done_callback(_on_diarization_done)
+                    diarization_segments = diarization_future
                 else:
-                    _log_stage(job_id, "Stage 3 complete — pyannote unavailable, will use gap-based detection")
+                    diarization_segments = stage_3_diarization(job_id)
+                    _log_diarization_result(job_id, diarization_segments)
 
         # --- Stage 4: Transcription (required) ---
         if start_from <= 4:
-            job = _get_job(job_id)
-            transcript = job.get("transcript_json")
-            if transcript and json.loads(transcript):
+            if not needs_transcript:
                 _log_stage(job_id, "Stage 4 skipped — transcript already exists")
             else:
                 _update_job(job_id, current_stage=4, stage_name="Transcription (Whisper)")
@@ -217,16 +242,32 @@ def run_pipeline(self, job_id: str, start_from: int = 1):
         _log_stage(job_id, "Pipeline completed successfully")
 
     except SoftTimeLimitExceeded:
+        pipeline_failed.set()
         logger.warning(f"Pipeline timed out for job {job_id}")
         _log_stage(job_id, "FAILED: Task exceeded time limit — please retry")
         _update_job(job_id, status="failed", error_message="Task exceeded time limit — please retry")
+        _abandon_diarization(diarization_future)
     except Exception as e:
+        pipeline_failed.set()
         logger.exception(f"Pipeline failed for job {job_id}")
         _log_stage(job_id, f"FAILED: {e}")
         _update_job(job_id, status="failed", error_message=str(e))
+        _abandon_diarization(diarization_future)
         raise
 
 
+def _abandon_diarization(future: Future | None):
+    """After a failed run, cancel a parallel diarization that hasn't started, or
+    wait for a running one (pyannote can't be interrupted) so it doesn't keep
+    running into the next task and a retry doesn't queue behind it."""
+    if future is None or future.cancel():
+        return
+    try:
+        future.result()
+    except Exception:
+        pass  # the pipeline has already failed; its error is the one reported
+
+
 @celery_app.task(bind=True, name="aipod.resume_pipeline")
 def resume_pipeline(self, job_id: str):
     """Resume the pipeline from stage 7 (after editor review)."""
@@ -241,8 +282,19 @@ def stage_1_audio_cleanup(job_id: str):
     original_file = job["original_file"]
     cleaned_path = str(BASE_DIR / settings.output_dir / job_id / "cleaned.mp3")
 
-    _log_stage(job_id, f"Uploading {Path(original_file).name} to Auphonic...")
-    uuid = _run_async(auphonic.process_audio(original_file, cleaned_path))
+    previous_uuid = job.get("auphonic_production_id")
+    if previous_uuid:
+        _log_stage(job_id, f"Checking earlier Auphonic production {previous_uuid}...")
+    else:
+        _log_stage(job_id, f"Uploading {Path(original_file).name} to Auphonic...")
+
+    # Persist the UUID immediately so a retry can resume instead of re-uploading
+    uuid = _run_async(auphonic.process_audio(
+        original_file,
+        cleaned_path,
+        production_uuid=previous_uuid,
+        on_created=lambda new_uuid: _update_job(job_id, auphonic_production_id=new_uuid),
+    ))
 
     _update_job(job_id, cleaned_file=cleaned_path, auphonic_production_id=uuid)
     _log_stage(job_id, f"Auphonic production {uuid} complete, cleaned audio saved")
@@ -273,7 +325,7 @@ def stage_2_source_separation(job_id: str):
 
 def stage_3_diarization(job_id: str) -> list[dict] | None:
     """Stage 3: Run speaker diarization using pyannote."""
-    from app.services.diarize import diarize
+    from app.services.diarize import diarize, unload_pipeline
 
     job = _get_job(job_id)
     audio_file = job.get("vocals_file") or job.get("cleaned_file") or job["original_file"]
@@ -281,11 +333,29 @@ def stage_3_diarization(job_id: str) -> list[dict] | None:
     _log_stage(job_id, "Running pyannote speaker diarization...")
     with _heartbeat(job_id, "Diarization"):
         diarization_segments = diarize(audio_file)
+
+    if not settings.diarization_keep_loaded:
+        # Release RAM for Whisper
+        unload_pipeline()
     return diarization_segments
 
 
-def stage_4_transcription(job_id: str, diarization_segments: list[dict] | None = None):
-    """Stage 4: Transcribe audio using Whisper."""
+def _log_diarization_result(job_id: str, diarization_segments: list[dict] | Future | None):
+    """Log the outcome of stage 3 (accepts the finished Future when run in parallel)."""
+    if isinstance(diarization_segments, Future):
+        if diarization_segments.exception() is not None:
+            return  # surfaces (and is logged) when stage 4 reads the result
+        diarization_segments = diarization_segments.result()
+    if diarization_segments:
+        speakers = set(s.get("speaker") for s in diarization_segments)
+        _log_stage(job_id, f"Stage 3 complete — {len(speakers)} speakers, {len(diarization_segments)} segments")
+    else:
+        _log_stage(job_id, "Stage 3 complete — pyannote unavailable, will use gap-based detection")
+
+
+def stage_4_transcription(job_id: str, diarization_segments: list[dict] | Future | None = None):
+    """Stage 4: Transcribe audio using Whisper.
+    diarization_segments may be a Future while stage 3 is still running."""
     from app.services.transcribe import transcribe
 
     job = _get_job(job_id)
@@ -296,6 +366,8 @@ def stage_4_transcription(job_id: str, diarization_segments: list[dict] | None =
         segments = transcribe(audio_file, diarization_segments=diarization_segments)
 
     _update_job(job_id, transcript_json=json.dumps(segments))
+    if isinstance(diarization_segments, Future):
+        diarization_segments = diarization_segments.result()
     method = "pyannote" if diarization_segments else "gap-based"
     _log_stage(job_id, f"Transcribed {len(segments)} segments ({method} speaker detection)")
 
@@ -356,10 +428,10 @@ def stage_6_voice_cloning(job_id: str):
     speaker_samples = audio.extract_best_speaker_samples(original_file, segments, samples_dir)
     _log_stage(job_id, f"Found {len(speaker_samples)} speakers, checking fingerprint cache...")
 
-    voice_map = {}
-    for speaker, sample_path in speaker_samples.items():
-        embedding = fingerprint.compute_embedding(sample_path)
+    embeddings = fingerprint.compute_embeddings(list(speaker_samples.values()))
 
+    voice_map = {}
+    for (speaker, sample_path), embedding in zip(speaker_samples.items(), embeddings):
         if embedding is not None:
             cached = fingerprint.find_matching_profile(embedding)
             if cached:
@@ -397,7 +469,7 @@ def stage_7_speech_generation(job_id: str):
     total_segments = sum(1 for s in segments if voice_map.get(s.get("speaker", "")) and s.get("translated_text", s.get("text", "")).strip())
     _log_stage(job_id, f"Generating TTS for {total_segments} segments via ElevenLabs...")
 
-    segment_files = []
+    tts_jobs = []
     for i, segment in enumerate(segments):
         speaker = segment.get("speaker", "Speaker")
         text = segment.get("translated_text", segment.get("text", ""))
@@ -407,11 +479,13 @@ def stage_7_speech_generation(job_id: str):
             continue
 
         out_path = str(Path(segments_dir) / f"segment_{i:04d}.mp3")
-        _run_async(elevenlabs.text_to_speech(text, voice_id, out_path))
-        segment_files.append(out_path)
+        tts_jobs.append({"text": text, "voice_id": voice_id, "output_path": out_path})
+
+    def _report_progress(done: int):
+        if done % 5 == 0:
+            _log_stage(job_id, f"TTS progress: {done}/{total_segments} segments done")
 
-        if len(segment_files) % 5 == 0:
-            _log_stage(job_id, f"TTS progress: {len(segment_files)}/{total_segments} segments done")
+    segment_files = _run_async(elevenlabs.text_to_speech_many(tts_jobs, on_done=_report_progress))
 
     _log_stage(job_id, f"All {len(segment_files)} TTS segments generated, stitching audio...")
 
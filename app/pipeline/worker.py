@@ -1,7 +1,13 @@
+import os
+
 from celery import Celery
-from celery.signals import worker_ready, worker_shutting_down
+from celery.signals import worker_ready, worker_shutting_down, worker_process_shutdown
+
+from app.config import settings, cpu_threads_per_worker
 
-from app.config import settings
+# Size OpenMP/MKL/OpenBLAS pools to this process's share of the cores before torch loads
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, str(cpu_threads_per_worker()))
 
 celery_app = Celery(
     "aipod",
@@ -18,6 +24,7 @@ celery_app.conf.update(
     task_track_started=True,
     task_acks_late=True,
     worker_prefetch_multiplier=1,
+    worker_concurrency=settings.celery_concurrency,
     include=["app.pipeline.tasks"],
     # Re-deliver unacked tasks after 30 min (covers long separation stage)
     broker_transport_options={"visibility_timeout": 1800},
@@ -65,3 +72,16 @@ def mark_inflight_failed(sender=None, **kwargs):
             print(f"[shutdown] Marked {len(inflight)} in-flight jobs as failed")
     finally:
         db.close()
+
+
+@worker_process_shutdown.connect
+def close_http_clients(sender=None, **kwargs):
+    """Close the shared per-service HTTP clients in each worker process."""
+    from app.pipeline.tasks import _run_async
+    from app.services import auphonic, elevenlabs, happyscribe
+
+    for service in (auphonic, elevenlabs, happyscribe):
+        try:
+            _run_async(service.aclose_client())
+        except Exception as e:
+            print(f"[shutdown] Could not close {service.__name__} HTTP client: {e}")
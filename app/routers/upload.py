@@ -19,6 +19,13 @@ router = APIRouter()
 REQUIRED_STAGES = {4, 6, 7}
 
 
+def _looks_like_mp3(head: bytes) -> bool:
+    """True if the header starts with an ID3 tag or an MPEG audio frame sync word."""
+    if head[:3] == b"ID3":
+        return True
+    return len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0
+
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -30,6 +37,12 @@ async def upload_file(
     if not file.filename or not file.filename.lower().endswith(".mp3"):
         raise HTTPException(status_code=400, detail="Only MP3 files are accepted")
 
+    # Sniff the header so misnamed files fail here, not later in ffmpeg
+    head = await file.read(10)
+    await file.seek(0)
+    if not _looks_like_mp3(head):
+        raise HTTPException(status_code=400, detail="Not a valid MP3 file")
+
     # Parse and validate stages
     try:
         enabled_stages = sorted(set(int(s.strip()) for s in stages.split(",") if s.strip()))
@@ -1,16 +1,102 @@
 import logging
+import subprocess
+import tempfile
 from pathlib import Path
 
+import numpy as np
 from pydub import AudioSegment
 
 logger = logging.getLogger(__name__)
 
+# ffmpeg opens one file descriptor per input — stitch long episodes in groups
+_MAX_FFMPEG_INPUTS = 128
+
+# Deliverable MP3s keep 192k CBR; speaker samples use LAME VBR -q:a 4 (~130-160 kb/s),
+# which is near-transparent and encodes roughly twice as fast
+_MP3_OUTPUT_ARGS = ["-c:a", "libmp3lame", "-b:a", "192k", "-threads", "0"]
+_MP3_SAMPLE_PARAMS = ["-q:a", "4", "-threads", "0"]
+_MP3_MASTER_PARAMS = ["-threads", "0"]
+_WAV_OUTPUT_ARGS = ["-c:a", "pcm_s16le"]
+
+# numpy dtypes for pydub sample widths (24-bit has no native dtype)
+_SAMPLE_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def _run_ffmpeg(args: list[str]) -> None:
+    """Run ffmpeg with the given arguments. Raises RuntimeError on failure."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args]
+    result = subprocess.run(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-2000:]}")
+
+
+def _load_audio(audio_path: str) -> AudioSegment:
+    """Load audio into an AudioSegment.
+
+    WAV files (separation stems) are read with soundfile straight into one
+    int16 buffer; other formats go through pydub's ffmpeg decode.
+    """
+    if audio_path.lower().endswith(".wav"):
+        try:
+            import soundfile as sf
+            data, sample_rate = sf.read(audio_path, dtype="int16", always_2d=True)
+            return AudioSegment(
+                data.tobytes(),
+                frame_rate=sample_rate,
+                sample_width=2,
+                channels=data.shape[1],
+            )
+        except Exception as e:
+            logger.warning(f"soundfile could not read {audio_path}, using pydub: {e}")
+    return AudioSegment.from_file(audio_path)
+
 
 def ensure_stereo(audio: AudioSegment) -> AudioSegment:
-    """Convert mono audio to stereo if needed."""
-    if audio.channels == 1:
-        audio = audio.set_channels(2)
-    return audio
+    """Convert mono audio to stereo if needed.
+
+    Duplicates the PCM buffer into interleaved L/R frames with a numpy
+    broadcast (one C-level copy) instead of pydub's audioop round-trip.
+    """
+    if audio.channels != 1:
+        return audio
+
+    dtype = _SAMPLE_DTYPES.get(audio.sample_width)
+    if dtype is None:
+        return audio.set_channels(2)
+
+    mono = np.frombuffer(audio.raw_data, dtype=dtype)
+    stereo = np.broadcast_to(mono[:, None], (mono.shape[0], 2))
+    return audio._spawn(
+        stereo.tobytes(),
+        overrides={"channels": 2, "frame_width": audio.sample_width * 2},
+    )
+
+
+def _overlay_samples(base: AudioSegment, overlay: AudioSegment) -> AudioSegment:
+    """Equivalent of base.overlay(overlay): sums the PCM samples in one
+    vectorized numpy add with saturation. Falls back to pydub when the
+    formats differ or the samples are not signed 16/32-bit."""
+    if (base.sample_width not in (2, 4) or overlay.sample_width != base.sample_width
+            or overlay.channels != base.channels or overlay.frame_rate != base.frame_rate):
+        return base.overlay(overlay)
+
+    dtype = _SAMPLE_DTYPES[base.sample_width]
+    wide = np.int32 if base.sample_width == 2 else np.int64
+    base_samples = np.frombuffer(base.raw_data, dtype=dtype)
+    overlay_samples = np.frombuffer(overlay.raw_data, dtype=dtype)
+
+    n = min(len(base_samples), len(overlay_samples))
+    mixed = base_samples.astype(wide)
+    mixed[:n] += overlay_samples[:n]
+    info = np.iinfo(dtype)
+    np.clip(mixed, info.min, info.max, out=mixed)
+    return base._spawn(mixed.astype(dtype).tobytes())
 
 
 def extract_speaker_sample(
@@ -23,7 +109,7 @@ def extract_speaker_sample(
 ) -> str:
     """Extract a speaker sample from the audio file for voice cloning.
     Ensures the sample is between min_duration_ms and max_duration_ms."""
-    audio = AudioSegment.from_file(audio_path)
+    audio = _load_audio(audio_path)
 
     # Clamp the duration
     duration = end_ms - start_ms
@@ -37,7 +123,7 @@ def extract_speaker_sample(
     sample = ensure_stereo(sample)
 
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    sample.export(output_path, format="mp3")
+    sample.export(output_path, format="mp3", codec="libmp3lame", parameters=_MP3_SAMPLE_PARAMS)
     return output_path
 
 
@@ -48,7 +134,7 @@ def extract_best_speaker_samples(
 ) -> dict[str, str]:
     """Extract the best audio sample for each unique speaker.
     Returns {speaker_label: sample_file_path}."""
-    audio = AudioSegment.from_file(audio_path)
+    audio = _load_audio(audio_path)
     speaker_segments: dict[str, list[dict]] = {}
 
     for seg in segments:
@@ -62,15 +148,20 @@ def extract_best_speaker_samples(
         # Sort by duration (longest first) to get the best sample
         segs.sort(key=lambda s: (s.get("end_time", 0) - s.get("start_time", 0)), reverse=True)
 
-        # Accumulate segments until we have 30-60 seconds
-        combined = AudioSegment.empty()
+        # Accumulate segments until we have 30-60 seconds, joining the PCM once
+        # at the end (repeated += would copy the whole buffer per segment)
+        parts = []
+        total_ms = 0
         for seg in segs:
             start_ms = int(seg.get("start_time", 0) * 1000)
             end_ms = int(seg.get("end_time", 0) * 1000)
             if end_ms > start_ms:
-                combined += audio[start_ms:end_ms]
-            if len(combined) >= 60000:
+                part = audio[start_ms:end_ms]
+                parts.append(part.raw_data)
+                total_ms += len(part)
+            if total_ms >= 60000:
                 break
+        combined = audio._spawn(b"".join(parts))
 
         if len(combined) < 5000:
             logger.warning(f"Speaker {speaker} has very short audio ({len(combined)}ms), using what's available")
@@ -81,44 +172,109 @@ def extract_best_speaker_samples(
 
         out_path = str(Path(output_dir) / f"speaker_{speaker.replace(' ', '_')}.mp3")
         Path(output_dir).mkdir(parents=True, exist_ok=True)
-        combined.export(out_path, format="mp3")
+        combined.export(out_path, format="mp3", codec="libmp3lame", parameters=_MP3_SAMPLE_PARAMS)
         samples[speaker] = out_path
 
     return samples
 
 
+def _duration_ms(path: str) -> float | None:
+    """Duration of an audio file from its headers (no decode), or None if unknown."""
+    try:
+        from mutagen import File as MutagenFile
+        info = MutagenFile(path)
+        return info.info.length * 1000 if info is not None else None
+    except Exception as e:
+        logger.warning(f"Could not read duration of {path}: {e}")
+        return None
+
+
+def _crossfade_files(
+    input_files: list[str],
+    output_path: str,
+    output_args: list[str],
+    crossfade_ms: int,
+    sample_rate: int,
+) -> None:
+    """Join input_files in one ffmpeg pass using a chained acrossfade filtergraph.
+
+    As with pydub's append, a join is only crossfaded when both the audio so
+    far and the next file are longer than crossfade_ms; shorter (or unknown
+    length) files are concatenated without one.
+    """
+    args = []
+    for f in input_files:
+        args += ["-i", f]
+
+    graph = [
+        f"[{i}:a]aformat=sample_rates={sample_rate}:channel_layouts=stereo[s{i}]"
+        for i in range(len(input_files))
+    ]
+    if len(input_files) == 1:
+        last = "s0"
+    elif crossfade_ms > 0:
+        duration = crossfade_ms / 1000
+        durations = [_duration_ms(f) for f in input_files]
+        combined_ms = durations[0]
+        last = "s0"
+        for i in range(1, len(input_files)):
+            segment_ms = durations[i]
+            if (combined_ms is not None and segment_ms is not None
+                    and combined_ms > crossfade_ms and segment_ms > crossfade_ms):
+                graph.append(f"[{last}][s{i}]acrossfade=d={duration}:c1=tri:c2=tri[x{i}]")
+                combined_ms += segment_ms - crossfade_ms
+            else:
+                graph.append(f"[{last}][s{i}]concat=n=2:v=0:a=1[x{i}]")
+                if combined_ms is not None and segment_ms is not None:
+                    combined_ms += segment_ms
+                else:
+                    combined_ms = None
+            last = f"x{i}"
+    else:
+        labels = "".join(f"[s{i}]" for i in range(len(input_files)))
+        graph.append(f"{labels}concat=n={len(input_files)}:v=0:a=1[joined]")
+        last = "joined"
+
+    args += ["-filter_complex", ";".join(graph), "-map", f"[{last}]", *output_args, output_path]
+    _run_ffmpeg(args)
+
+
 def stitch_segments(
     segment_files: list[str],
     output_path: str,
     crossfade_ms: int = 100,
     sample_rate: int = 44100,
 ) -> str:
-    """Stitch multiple audio segment files together with crossfades."""
+    """Stitch multiple audio segment files together with crossfades.
+
+    Decoding, resampling, crossfading and the single MP3 encode all happen
+    inside ffmpeg. Long segment lists are joined in groups to lossless WAV
+    first, then the groups are crossfaded and encoded once.
+    """
     if not segment_files:
         raise ValueError("No segment files to stitch")
 
-    combined = AudioSegment.from_file(segment_files[0])
-    combined = ensure_stereo(combined)
-    combined = combined.set_frame_rate(sample_rate)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
 
-    for seg_file in segment_files[1:]:
-        segment = AudioSegment.from_file(seg_file)
-        segment = ensure_stereo(segment)
-        segment = segment.set_frame_rate(sample_rate)
+    if len(segment_files) <= _MAX_FFMPEG_INPUTS:
+        _crossfade_files(segment_files, output_path, _MP3_OUTPUT_ARGS, crossfade_ms, sample_rate)
+        return output_path
 
-        if crossfade_ms > 0 and len(combined) > crossfade_ms and len(segment) > crossfade_ms:
-            combined = combined.append(segment, crossfade=crossfade_ms)
-        else:
-            combined += segment
+    with tempfile.TemporaryDirectory(dir=Path(output_path).parent) as tmp_dir:
+        parts = []
+        for start in range(0, len(segment_files), _MAX_FFMPEG_INPUTS):
+            part_path = str(Path(tmp_dir) / f"part_{len(parts):03d}.wav")
+            group = segment_files[start:start + _MAX_FFMPEG_INPUTS]
+            _crossfade_files(group, part_path, _WAV_OUTPUT_ARGS, crossfade_ms, sample_rate)
+            parts.append(part_path)
+        _crossfade_files(parts, output_path, _MP3_OUTPUT_ARGS, crossfade_ms, sample_rate)
 
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    combined.export(output_path, format="mp3", bitrate="192k")
     return output_path
 
 
 def normalize_audio(audio_path: str, target_dbfs: float = -16.0) -> AudioSegment:
     """Normalize audio to a target loudness."""
-    audio = AudioSegment.from_file(audio_path)
+    audio = _load_audio(audio_path)
     change_in_dbfs = target_dbfs - audio.dBFS
     return audio.apply_gain(change_in_dbfs)
 
@@ -141,8 +297,8 @@ def smart_mix(
     If TTS is longer/shorter than original speech, the middle background is
     looped or trimmed so the intro and outro still fit properly.
     """
-    tts = AudioSegment.from_file(tts_path)
-    background = AudioSegment.from_file(background_path)
+    tts = _load_audio(tts_path)
+    background = _load_audio(background_path)
 
     tts = ensure_stereo(tts)
     background = ensure_stereo(background)
@@ -152,7 +308,7 @@ def smart_mix(
 
     if bg_len == 0:
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        tts.export(output_path, format="mp3", bitrate="192k")
+        tts.export(output_path, format="mp3", bitrate="192k", parameters=_MP3_MASTER_PARAMS)
         logger.info("Background is empty, exporting TTS only")
         return output_path
 
@@ -209,7 +365,7 @@ def smart_mix(
             tts = tts + AudioSegment.silent(
                 duration=mbq_len - tts_len, frame_rate=tts.frame_rate
             )
-        mixed_middle = tts.overlay(middle_bg_quiet)
+        mixed_middle = _overlay_samples(tts, middle_bg_quiet)
     else:
         mixed_middle = tts
 
@@ -234,7 +390,7 @@ def smart_mix(
             final = final + outro_bg
 
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    final.export(output_path, format="mp3", bitrate="192k")
+    final.export(output_path, format="mp3", bitrate="192k", parameters=_MP3_MASTER_PARAMS)
     logger.info(f"Smart mix complete: intro={intro_len}ms + speech={len(mixed_middle)}ms "
                 f"+ outro={outro_len}ms = {len(final)}ms total, output: {output_path}")
     return output_path
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 from pathlib import Path
+from typing import Callable
 
 import httpx
 
@@ -12,74 +13,111 @@ BASE_URL = "https://auphonic.com/api"
 POLL_INTERVAL = 10
 MAX_POLL_ATTEMPTS = 180  # 30 minutes max
 
+# Status of a production whose upload finished but which was never started
+NOT_STARTED_STATUS = "Production Not Started Yet"
+FAILED_STATUSES = ("Error", "Incomplete")
+
 
 def _headers():
     return {"Authorization": f"Bearer {settings.auphonic_api_key}"}
 
 
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared client so the create/upload/poll/download calls reuse one connection pool."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120, connect=10),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared client (called on worker shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def create_production(file_path: str, preset: str | None = None) -> str:
     """Upload audio to Auphonic and create a production. Returns production UUID."""
-    async with httpx.AsyncClient(timeout=120) as client:
-        payload = {
-            "output_files": [{"format": "mp3", "bitrate": "192"}],
-            "algorithms": {
-                "leveler": True,
-                "denoise": True,
-                "loudness_target": -16,
-            },
-        }
-        if preset:
-            payload["preset"] = preset
-
+    client = _get_client()
+    payload = {
+        "output_files": [{"format": "mp3", "bitrate": "192"}],
+        "algorithms": {
+            "leveler": True,
+            "denoise": True,
+            "loudness_target": -16,
+        },
+    }
+    if preset:
+        payload["preset"] = preset
+
+    resp = await client.post(
+        f"{BASE_URL}/productions.json",
+        json=payload,
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+    production_uuid = resp.json()["data"]["uuid"]
+
+    # Upload audio file
+    with open(file_path, "rb") as f:
         resp = await client.post(
-            f"{BASE_URL}/productions.json",
-            json=payload,
+            f"{BASE_URL}/production/{production_uuid}/upload.json",
+            files={"input_file": (Path(file_path).name, f, "audio/mpeg")},
             headers=_headers(),
         )
         resp.raise_for_status()
-        production_uuid = resp.json()["data"]["uuid"]
-
-        # Upload audio file
-        with open(file_path, "rb") as f:
-            resp = await client.post(
-                f"{BASE_URL}/production/{production_uuid}/upload.json",
-                files={"input_file": (Path(file_path).name, f, "audio/mpeg")},
-                headers=_headers(),
-            )
-            resp.raise_for_status()
 
-        return production_uuid
+    return production_uuid
 
 
 async def start_production(production_uuid: str) -> None:
     """Start processing a production."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(
-            f"{BASE_URL}/production/{production_uuid}/start.json",
+    client = _get_client()
+    resp = await client.post(
+        f"{BASE_URL}/production/{production_uuid}/start.json",
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+
+
+async def get_production(production_uuid: str) -> dict:
+    """Fetch the current production data (status, output files, ...)."""
+    client = _get_client()
+    resp = await client.get(
+        f"{BASE_URL}/production/{production_uuid}.json",
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+    return resp.json()["data"]
+
+
+async def poll_production(production_uuid: str) -> dict:
+    """Poll until production completes. Returns production data."""
+    client = _get_client()
+    for _ in range(MAX_POLL_ATTEMPTS):
+        resp = await client.get(
+            f"{BASE_URL}/production/{production_uuid}.json",
             headers=_headers(),
         )
         resp.raise_for_status()
+        data = resp.json()["data"]
+        status = data.get("status_string", "")
 
+        if status == "Done":
+            return data
+        elif status in FAILED_STATUSES:
+            raise RuntimeError(f"Auphonic production failed: {data.get('error_message', status)}")
 
-async def poll_production(production_uuid: str) -> dict:
-    """Poll until production completes. Returns production data."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        for _ in range(MAX_POLL_ATTEMPTS):
-            resp = await client.get(
-                f"{BASE_URL}/production/{production_uuid}.json",
-                headers=_headers(),
-            )
-            resp.raise_for_status()
-            data = resp.json()["data"]
-            status = data.get("status_string", "")
-
-            if status == "Done":
-                return data
-            elif status in ("Error", "Incomplete"):
-                raise RuntimeError(f"Auphonic production failed: {data.get('error_message', status)}")
-
-            logger.info(f"Auphonic production {production_uuid}: {status}")
-            await asyncio.sleep(POLL_INTERVAL)
+        logger.info(f"Auphonic production {production_uuid}: {status}")
+        await asyncio.sleep(POLL_INTERVAL)
 
     raise TimeoutError(f"Auphonic production {production_uuid} timed out")
 
@@ -94,21 +132,46 @@ async def download_output(production_data: dict, output_path: str) -> str:
     if not download_url:
         raise RuntimeError("No download URL in Auphonic output")
 
-    async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
-        resp = await client.get(download_url, headers=_headers())
-        resp.raise_for_status()
+    client = _get_client()
+    resp = await client.get(download_url, headers=_headers(), follow_redirects=True)
+    resp.raise_for_status()
 
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "wb") as f:
-            f.write(resp.content)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(resp.content)
 
     return output_path
 
 
-async def process_audio(file_path: str, output_path: str) -> str:
-    """Full Auphonic pipeline: create, start, poll, download."""
-    uuid = await create_production(file_path)
-    await start_production(uuid)
-    data = await poll_production(uuid)
+async def process_audio(
+    file_path: str,
+    output_path: str,
+    production_uuid: str | None = None,
+    on_created: Callable[[str], None] | None = None,
+) -> str:
+    """Full Auphonic pipeline: create, start, poll, download.
+
+    Pass the production_uuid of an earlier attempt to resume it without
+    re-uploading the audio. on_created is called with the new UUID as soon
+    as a production has been created, so the caller can persist it.
+    """
+    status = None
+    if production_uuid:
+        try:
+            status = (await get_production(production_uuid)).get("status_string", "")
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not resume Auphonic production {production_uuid}: {e}")
+
+    if status is None or status in FAILED_STATUSES:
+        production_uuid = await create_production(file_path)
+        if on_created:
+            on_created(production_uuid)
+        status = NOT_STARTED_STATUS
+    else:
+        logger.info(f"Resuming Auphonic production {production_uuid} ({status})")
+
+    if status == NOT_STARTED_STATUS:
+        await start_production(production_uuid)
+    data = await poll_production(production_uuid)
     await download_output(data, output_path)
-    return uuid
+    return production_uuid
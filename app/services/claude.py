@@ -1,48 +1,180 @@
+import asyncio
+import hashlib
 import json
 import logging
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from typing import Callable
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 import anthropic
 import openai
 
 from app.config import settings
+from app.database import SessionLocal
+from app.models import LLMCacheEntry
 
 logger = logging.getLogger(__name__)
 
-POLISH_SYSTEM_PROMPT = """You are an expert podcast translator. You receive original transcript segments
-and their machine translations. Your job is to polish the translations to sound natural and conversational.
-
-Rules:
+_POLISH_RULES = """Rules:
 - Preserve the speaker's personality and tone
 - Adapt idioms and cultural references appropriately
 - Maintain a conversational, podcast-friendly tone
 - Keep the meaning accurate while making it sound natural
 - Preserve any emotion markers like [Laughing], [Thoughtful], etc.
-- Keep speaker labels and timestamps unchanged
+- Keep speaker labels and timestamps unchanged"""
+
+POLISH_SYSTEM_PROMPT = f"""You are an expert podcast translator. You receive original transcript segments
+and their machine translations. Your job is to polish the translations to sound natural and conversational.
+
+{_POLISH_RULES}
 - Return ONLY the polished translation text, nothing else"""
 
+POLISH_BATCH_SYSTEM_PROMPT = f"""You are an expert podcast translator. You receive a JSON array of transcript
+segments, each with an id, its source language, the original text ("original") and a machine
+translation ("mt"). Your job is to polish every translation to sound natural and conversational.
+
+{_POLISH_RULES}
+- Return ONLY a JSON array with one {{"id": <id>, "polished": "<text>"}} object per input segment, nothing else"""
+
+ANTHROPIC_MODEL = "claude-sonnet-4-5-20250929"
+ANTHROPIC_FAST_MODEL = "claude-haiku-4-5-20251001"
+OPENAI_MODEL = "gpt-4o"
+OPENAI_FAST_MODEL = "gpt-4o-mini"
+
+# Segments up to this many words are polished with the fast model first
+FAST_POLISH_MAX_WORDS = 25
+
+# Clients are cached per API key so a changed key (e.g. in tests) gets a fresh client
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=2)
+def _anthropic_client(api_key: str) -> anthropic.AsyncAnthropic:
+    return anthropic.AsyncAnthropic(api_key=api_key)
+
+
+@lru_cache(maxsize=2)
+def _openai_client(api_key: str) -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(api_key=api_key)
+
 
-def _llm_complete(system: str, user_message: str, max_tokens: int = 1024) -> str:
-    """Call an LLM: tries Anthropic first, falls back to OpenAI."""
+def _get_anthropic_client() -> anthropic.AsyncAnthropic | None:
+    """Shared async Anthropic client (reuses its HTTP connection pool)."""
+    if not settings.anthropic_api_key:
+        return None
+    with _client_lock:
+        return _anthropic_client(settings.anthropic_api_key)
+
+
+def _get_openai_client() -> openai.AsyncOpenAI | None:
+    """Shared async OpenAI client (reuses its HTTP connection pool)."""
+    if not settings.openai_api_key:
+        return None
+    with _client_lock:
+        return _openai_client(settings.openai_api_key)
+
+
+def _cache_key(system: str, user_message: str, max_tokens: int, fast: bool) -> str:
+    # Key on the model names so changing a model doesn't serve the old model's output
+    models = [ANTHROPIC_FAST_MODEL, OPENAI_FAST_MODEL] if fast else [ANTHROPIC_MODEL, OPENAI_MODEL]
+    payload = json.dumps([system, user_message, max_tokens, models])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(hours=settings.llm_cache_ttl_hours)
+
+
+def _cache_get(key: str) -> str | None:
+    """Return a cached LLM response younger than llm_cache_ttl_hours, if any."""
+    cutoff = _cache_cutoff()
+    db = SessionLocal()
+    try:
+        entry = (
+            db.query(LLMCacheEntry)
+            .filter(LLMCacheEntry.hash == key, LLMCacheEntry.created_at >= cutoff)
+            .first()
+        )
+        return entry.response if entry else None
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _cache_put(key: str, response: str) -> None:
+    """Store an LLM response and prune entries older than llm_cache_ttl_hours."""
+    db = SessionLocal()
+    try:
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < _cache_cutoff()).delete()
+        db.merge(LLMCacheEntry(hash=key, response=response, created_at=datetime.now(timezone.utc)))
+        db.commit()
+    except Exception as e:
+        logger.warning(f"LLM cache write failed: {e}")
+    finally:
+        db.close()
+
+
+async def _llm_complete(
+    system: str,
+    user_message: str,
+    max_tokens: int = 1024,
+    fast: bool = False,
+    semaphore: asyncio.Semaphore | None = None,
+    validate: Callable[[str], bool] | None = None,
+) -> str:
+    """Call an LLM, serving repeated identical requests from the llm_cache table.
+    Cache reads/writes are blocking SQLite calls, so they run in a worker thread.
+    semaphore, if given, bounds the in-flight API requests (cache hits skip it).
+    validate, if given, must accept a reply for it to be cached or served from cache."""
+    if settings.llm_cache_ttl_hours <= 0:
+        async with semaphore or nullcontext():
+            return await _llm_complete_uncached(system, user_message, max_tokens, fast)
+
+    key = _cache_key(system, user_message, max_tokens, fast)
+    cached = await asyncio.to_thread(_cache_get, key)
+    if cached is not None and (validate is None or validate(cached)):
+        return cached
+
+    async with semaphore or nullcontext():
+        result = await _llm_complete_uncached(system, user_message, max_tokens, fast)
+    if validate is None or validate(result):
+        await asyncio.to_thread(_cache_put, key, result)
+    return result
+
+
+async def _llm_complete_uncached(system: str, user_message: str, max_tokens: int = 1024, fast: bool = False) -> str:
+    """Call an LLM: tries Anthropic first, falls back to OpenAI.
+    fast=True uses the smaller, lower-latency model of each provider."""
     # Try Anthropic
-    if settings.anthropic_api_key:
+    client = _get_anthropic_client()
+    if client is not None:
         try:
-            client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
-            message = client.messages.create(
-                model="claude-sonnet-4-5-20250929",
+            message = await client.messages.create(
+                model=ANTHROPIC_FAST_MODEL if fast else ANTHROPIC_MODEL,
                 max_tokens=max_tokens,
-                system=system,
+                # Mark the system prompt cacheable — it is identical on every call
+                system=[{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
                 messages=[{"role": "user", "content": user_message}],
             )
+            usage = message.usage
+            logger.info(f"Anthropic prompt cache: read={getattr(usage, 'cache_read_input_tokens', 0) or 0} "
+                        f"created={getattr(usage, 'cache_creation_input_tokens', 0) or 0} "
+                        f"uncached={usage.input_tokens} input tokens")
             return message.content[0].text.strip()
         except Exception as e:
             logger.warning(f"Anthropic failed: {e}")
 
     # Fall back to OpenAI
-    if settings.openai_api_key:
+    client = _get_openai_client()
+    if client is not None:
         try:
-            client = openai.OpenAI(api_key=settings.openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o",
+            response = await client.chat.completions.create(
+                model=OPENAI_FAST_MODEL if fast else OPENAI_MODEL,
                 max_tokens=max_tokens,
                 messages=[
                     {"role": "system", "content": system},
@@ -61,6 +193,7 @@ async def polish_translation(
     machine_translation: str,
     source_lang_name: str,
     target_lang_name: str,
+    semaphore: asyncio.Semaphore | None = None,
 ) -> str:
     """Polish a machine translation using an LLM."""
     if not machine_translation.strip():
@@ -72,35 +205,150 @@ async def polish_translation(
         f"Please provide a polished, natural-sounding {target_lang_name} translation:"
     )
 
-    return _llm_complete(POLISH_SYSTEM_PROMPT, user_message)
+    if len(machine_translation.split()) <= FAST_POLISH_MAX_WORDS:
+        result = await _llm_complete(
+            POLISH_SYSTEM_PROMPT, user_message, fast=True, semaphore=semaphore,
+            validate=lambda reply: _is_plausible_polish(machine_translation, reply),
+        )
+        if _is_plausible_polish(machine_translation, result):
+            return result
+        logger.info("Fast-model polish diverged from the machine translation, retrying with full model")
 
+    return await _llm_complete(POLISH_SYSTEM_PROMPT, user_message, semaphore=semaphore)
 
-async def polish_segments(
+
+def _is_plausible_polish(machine_translation: str, polished: str) -> bool:
+    """Cheap quality check: a polish should stay roughly the length of its input."""
+    if not polished:
+        return False
+    ratio = len(polished) / max(len(machine_translation), 1)
+    return 0.5 <= ratio <= 2.0
+
+
+def _source_lang_name(segment: dict, default: str) -> str:
+    detected = segment.get("detected_language", {})
+    return detected.get("name") if detected.get("code", "unknown") != "unknown" else default
+
+
+def _parse_json_array(text: str) -> list:
+    """Parse a JSON array from an LLM reply, tolerating a ```json fenced block."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+def _is_json_array(text: str) -> bool:
+    try:
+        return isinstance(_parse_json_array(text), list)
+    except ValueError:
+        return False
+
+
+async def polish_batch(
     segments: list[dict],
     target_lang_name: str,
     default_source_lang_name: str = "the original language",
-) -> list[dict]:
-    """Polish all translated segments. Uses per-segment detected_language when available."""
-    polished = []
-    for segment in segments:
-        detected = segment.get("detected_language", {})
-        source_name = detected.get("name") if detected.get("code", "unknown") != "unknown" else default_source_lang_name
-
+    semaphore: asyncio.Semaphore | None = None,
+) -> list[str]:
+    """Polish several segments in one LLM request with structured JSON output.
+    Returns the polished texts in input order. Segments missing from the reply
+    are polished individually. semaphore bounds every API request made."""
+    items = []
+    for i, segment in enumerate(segments):
+        machine_translation = segment.get("translated_text", segment["text"])
+        if machine_translation.strip():
+            items.append({
+                "id": i,
+                "source_lang": _source_lang_name(segment, default_source_lang_name),
+                "original": segment["text"],
+                "mt": machine_translation,
+            })
+
+    polished_by_id = {}
+    if items:
+        user_message = (
+            f"Target language: {target_lang_name}\n\n"
+            f"Segments:\n{json.dumps(items, ensure_ascii=False)}"
+        )
+        reply = await _llm_complete(
+            POLISH_BATCH_SYSTEM_PROMPT, user_message, max_tokens=8192,
+            semaphore=semaphore, validate=_is_json_array,
+        )
         try:
-            result = await polish_translation(
+            for entry in _parse_json_array(reply):
+                if isinstance(entry, dict) and isinstance(entry.get("polished"), str):
+                    # Models sometimes echo ids as strings ("3")
+                    try:
+                        entry_id = int(entry.get("id"))
+                    except (TypeError, ValueError):
+                        continue
+                    polished_by_id[entry_id] = entry["polished"].strip()
+        except ValueError as e:
+            logger.warning(f"Could not parse batch polish reply, polishing segments individually: {e}")
+
+    async def _polish_one(segment: dict, machine_translation: str) -> str:
+        try:
+            return await polish_translation(
                 original_text=segment["text"],
-                machine_translation=segment.get("translated_text", segment["text"]),
-                source_lang_name=source_name,
+                machine_translation=machine_translation,
+                source_lang_name=_source_lang_name(segment, default_source_lang_name),
                 target_lang_name=target_lang_name,
+                semaphore=semaphore,
             )
         except Exception as e:
             logger.error(f"LLM polishing failed for segment: {e}")
-            result = segment.get("translated_text", segment["text"])
+            return machine_translation
+
+    results = []
+    fallbacks = {}
+    for i, segment in enumerate(segments):
+        machine_translation = segment.get("translated_text", segment["text"])
+        if not machine_translation.strip():
+            results.append(machine_translation)
+        elif polished_by_id.get(i):
+            results.append(polished_by_id[i])
+        else:
+            results.append(machine_translation)
+            fallbacks[i] = _polish_one(segment, machine_translation)
+
+    # Segments missing from the reply are polished individually, concurrently
+    if fallbacks:
+        for i, text in zip(fallbacks, await asyncio.gather(*fallbacks.values())):
+            results[i] = text
+    return results
 
-        polished.append({
-            **segment,
-            "translated_text": result,
-        })
+
+async def polish_segments(
+    segments: list[dict],
+    target_lang_name: str,
+    default_source_lang_name: str = "the original language",
+) -> list[dict]:
+    """Polish all translated segments in batches of settings.polish_batch_size,
+    running batches concurrently. settings.llm_concurrency bounds the in-flight
+    API requests, including per-segment fallbacks.
+    Uses per-segment detected_language when available."""
+    semaphore = asyncio.Semaphore(settings.llm_concurrency)
+    batch_size = max(1, settings.polish_batch_size)
+    batches = [segments[i:i + batch_size] for i in range(0, len(segments), batch_size)]
+
+    async def _polish(batch: list[dict]) -> list[str]:
+        try:
+            return await polish_batch(batch, target_lang_name, default_source_lang_name, semaphore)
+        except Exception as e:
+            logger.error(f"LLM polishing failed for batch of {len(batch)} segments: {e}")
+            return [s.get("translated_text", s["text"]) for s in batch]
+
+    results = await asyncio.gather(*(_polish(b) for b in batches))
+
+    polished = []
+    for batch, texts in zip(batches, results):
+        for segment, text in zip(batch, texts):
+            polished.append({
+                **segment,
+                "translated_text": text,
+            })
 
     return polished
 
@@ -109,7 +357,6 @@ async def generate_report(job_data: dict) -> str:
     """Build a pipeline report from real job data only — no LLM, no hallucination."""
     from app.config import get_language
 
-    segments = json.loads(job_data.get("transcript_json") or "[]")
     translated = json.loads(job_data.get("edited_json") or job_data.get("translated_json") or "[]")
     detected_langs = json.loads(job_data.get("detected_languages_json") or "[]")
     voice_map = json.loads(job_data.get("voice_map_json") or "{}")
@@ -129,7 +376,13 @@ async def generate_report(job_data: dict) -> str:
     translated_count = total_segments - len(untranslated)
     translation_pct = round(translated_count / total_segments * 100, 1) if total_segments else 0
 
-    duration_secs = max((s.get("end_time", 0) for s in segments), default=0)
+    # Segments are in playback order, so the last one ends the episode. Translated
+    # segments carry the transcript timings, so the transcript is only parsed as a fallback.
+    if translated and "end_time" in translated[-1]:
+        duration_secs = translated[-1]["end_time"]
+    else:
+        segments = json.loads(job_data.get("transcript_json") or "[]")
+        duration_secs = segments[-1].get("end_time", 0) if segments else 0
     duration_min = round(duration_secs / 60, 1)
 
     num_speakers = len(voice_map)
@@ -173,10 +426,8 @@ async def generate_report(job_data: dict) -> str:
         lines.append("## Untranslated Segments")
         lines.append(f"- **{len(untranslated)}** segment{'s' if len(untranslated) != 1 else ''} came back unchanged (original text = translated text)")
         # Group by detected language
-        by_lang: dict[str, int] = {}
-        for u in untranslated:
-            by_lang[u["language"]] = by_lang.get(u["language"], 0) + 1
-        for lang, count in sorted(by_lang.items(), key=lambda x: -x[1]):
+        by_lang = Counter(u["language"] for u in untranslated)
+        for lang, count in by_lang.most_common():
             lines.append(f"  - {count} segment{'s' if count != 1 else ''} in **{lang}**")
         # Show a few examples
         for u in untranslated[:5]:
@@ -1,20 +1,50 @@
+import asyncio
 import logging
+import random
+import threading
+import time
 
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests
 
-from app.config import get_language
+from app.config import get_language, settings
 
 logger = logging.getLogger(__name__)
 
+MAX_RETRIES = 3
+
+_local = threading.local()
+
+
+def _get_translator(source: str, target: str) -> GoogleTranslator:
+    """Reuse one translator per thread and language pair.
+    GoogleTranslator.translate() mutates instance state, so instances are not shared across threads."""
+    translators = getattr(_local, "translators", None)
+    if translators is None:
+        translators = _local.translators = {}
+    key = (source, target)
+    if key not in translators:
+        translators[key] = GoogleTranslator(source=source, target=target)
+    return translators[key]
+
 
 def translate_text(text: str, target_lang: str, source_lang: str | None = None) -> str:
-    """Translate text using Google Translate. source_lang='auto' for auto-detect."""
+    """Translate text using Google Translate. source_lang='auto' for auto-detect.
+    Retries rate-limited and failed requests with exponential backoff."""
     if not text.strip():
         return text
 
     src = source_lang if source_lang and source_lang != "auto" else "auto"
-    translator = GoogleTranslator(source=src, target=target_lang)
-    return translator.translate(text)
+    translator = _get_translator(src, target_lang)
+    for attempt in range(MAX_RETRIES):
+        try:
+            return translator.translate(text)
+        except (TooManyRequests, RequestError) as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt + random.uniform(0, 1)
+            logger.warning(f"Google Translate request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
 
 
 async def translate_segments(
@@ -22,18 +52,24 @@ async def translate_segments(
     target_lang: str,
 ) -> list[dict]:
     """Translate all segments using Google Translate with auto-detection.
+    Blocking requests run in worker threads, settings.translate_concurrency at a time.
     Returns segments with 'translated_text' field."""
-    translated = []
-    for segment in segments:
-        text = segment["text"]
+    semaphore = asyncio.Semaphore(settings.translate_concurrency)
+
+    async def _translate(text: str) -> str:
         try:
-            # Always use auto-detect — langdetect codes are unreliable for
-            # underrepresented languages and cause Google Translate to skip them
-            result = translate_text(text, target_lang, "auto")
+            async with semaphore:
+                # Always use auto-detect — langdetect codes are unreliable for
+                # underrepresented languages and cause Google Translate to skip them
+                return await asyncio.to_thread(translate_text, text, target_lang, "auto")
         except Exception as e:
             logger.error(f"Google Translate failed for segment: {e}")
-            result = text
+            return text
 
+    results = await asyncio.gather(*(_translate(s["text"]) for s in segments))
+
+    translated = []
+    for segment, result in zip(segments, results):
         translated.append({
             **segment,
             "translated_text": result,
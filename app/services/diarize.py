@@ -1,15 +1,22 @@
 import gc
 import logging
+import subprocess
 import tempfile
 from pathlib import Path
 
-from app.config import settings
+from app.config import settings, diarization_cpu_threads
 
 logger = logging.getLogger(__name__)
 
+_pipeline = None
+
+
+def _get_pipeline():
+    """Lazy-load the pyannote speaker diarization pipeline (cached until unload_pipeline())."""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
 
-def _load_pipeline():
-    """Load the pyannote speaker diarization pipeline (not cached — freed after use)."""
     try:
         from pyannote.audio import Pipeline
 
@@ -19,12 +26,12 @@ def _load_pipeline():
             return None
 
         logger.info("Loading pyannote speaker-diarization-3.1 pipeline...")
-        pipeline = Pipeline.from_pretrained(
+        _pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization-3.1",
             token=token,
         )
         logger.info("pyannote pipeline loaded")
-        return pipeline
+        return _pipeline
 
     except ImportError:
         logger.warning("pyannote.audio not installed — diarization unavailable")
@@ -34,19 +41,41 @@ def _load_pipeline():
         return None
 
 
+def unload_pipeline():
+    """Drop the cached pipeline to release its RAM (e.g. before loading Whisper on small instances)."""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline = None
+        gc.collect()
+        logger.info("pyannote pipeline unloaded")
+
+
 def _convert_to_wav(audio_path: str) -> str | None:
-    """Convert MP3 to WAV for pyannote compatibility (avoids sample count mismatch)."""
+    """Convert MP3 to WAV for pyannote compatibility (avoids sample count mismatch).
+
+    Decodes with a single ffmpeg pass straight to 16 kHz mono PCM — the format
+    pyannote resamples to anyway — so no decoded copy is held in Python memory.
+    """
     if not audio_path.lower().endswith(".mp3"):
         return None
+    with tempfile.NamedTemporaryFile(suffix=".diarize.wav", delete=False) as tmp:
+        wav_path = tmp.name
     try:
-        from pydub import AudioSegment
-        wav_path = str(Path(audio_path).with_suffix(".diarize.wav"))
-        audio = AudioSegment.from_mp3(audio_path)
-        audio.export(wav_path, format="wav")
-        logger.info(f"Converted {Path(audio_path).name} to WAV for diarization")
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", audio_path,
+             "-ac", "1", "-ar", "16000", "-acodec", "pcm_s16le", wav_path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip()[-2000:])
+        logger.info(f"Converted {Path(audio_path).name} to 16 kHz mono WAV for diarization")
         return wav_path
     except Exception as e:
         logger.warning(f"MP3→WAV conversion failed: {e}")
+        Path(wav_path).unlink(missing_ok=True)
         return None
 
 
@@ -56,7 +85,7 @@ def diarize(audio_path: str) -> list[dict] | None:
     Returns a list of segments: [{"speaker": "SPEAKER_00", "start": 0.5, "end": 3.2}, ...]
     Returns None if HF_TOKEN is missing or pyannote is unavailable (triggers gap-based fallback).
     """
-    pipeline = _load_pipeline()
+    pipeline = _get_pipeline()
     if pipeline is None:
         return None
 
@@ -66,7 +95,15 @@ def diarize(audio_path: str) -> list[dict] | None:
         diarize_path = wav_path or audio_path
 
         logger.info(f"Running speaker diarization on {diarize_path}")
-        diarization = pipeline(diarize_path)
+        # torch's pool is process-wide: hold it to pyannote's share while Whisper
+        # may be decoding alongside, then restore it
+        import torch
+        previous_threads = torch.get_num_threads()
+        torch.set_num_threads(diarization_cpu_threads())
+        try:
+            diarization = pipeline(diarize_path)
+        finally:
+            torch.set_num_threads(previous_threads)
 
         segments = []
         # pyannote 4.x returns an Annotation with itertracks()
@@ -101,7 +138,3 @@ def diarize(audio_path: str) -> list[dict] | None:
     except Exception as e:
         logger.warning(f"Diarization failed: {e}")
         return None
-    finally:
-        # Free the pipeline to release RAM for Whisper
-        del pipeline
-        gc.collect()
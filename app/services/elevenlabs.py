@@ -1,6 +1,9 @@
+import asyncio
 import logging
 from pathlib import Path
+from typing import Callable
 
+import aiofiles
 import httpx
 
 from app.config import settings
@@ -8,6 +11,7 @@ from app.config import settings
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://api.elevenlabs.io/v1"
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 def _headers():
@@ -16,18 +20,43 @@ def _headers():
     }
 
 
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared client so per-segment TTS calls reuse keep-alive connections."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120, connect=10),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared client (called on worker shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def clone_voice(name: str, audio_path: str) -> str:
     """Clone a voice from an audio sample. Returns voice_id."""
-    async with httpx.AsyncClient(timeout=120) as client:
-        with open(audio_path, "rb") as f:
-            resp = await client.post(
-                f"{BASE_URL}/voices/add",
-                headers=_headers(),
-                data={"name": name, "description": f"Cloned voice for {name}"},
-                files={"files": (Path(audio_path).name, f, "audio/mpeg")},
-            )
-            resp.raise_for_status()
-            return resp.json()["voice_id"]
+    # Samples are capped at 60s (~1 MB), so read them whole — but without blocking the loop
+    async with aiofiles.open(audio_path, "rb") as f:
+        sample = await f.read()
+
+    client = _get_client()
+    resp = await client.post(
+        f"{BASE_URL}/voices/add",
+        headers=_headers(),
+        data={"name": name, "description": f"Cloned voice for {name}"},
+        files={"files": (Path(audio_path).name, sample, "audio/mpeg")},
+    )
+    resp.raise_for_status()
+    return resp.json()["voice_id"]
 
 
 async def text_to_speech(
@@ -36,36 +65,78 @@ async def text_to_speech(
     output_path: str,
     model_id: str = "eleven_multilingual_v2",
 ) -> str:
-    """Generate speech from text using a cloned voice. Returns output file path."""
-    async with httpx.AsyncClient(timeout=120) as client:
-        resp = await client.post(
-            f"{BASE_URL}/text-to-speech/{voice_id}",
-            headers={**_headers(), "Content-Type": "application/json"},
-            json={
-                "text": text,
-                "model_id": model_id,
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.75,
-                    "style": 0.5,
-                    "use_speaker_boost": True,
-                },
+    """Generate speech from text using a cloned voice. Returns output file path.
+    Uses the streaming endpoint and writes audio to disk chunk by chunk as it arrives."""
+    await asyncio.to_thread(Path(output_path).parent.mkdir, parents=True, exist_ok=True)
+
+    client = _get_client()
+    async with client.stream(
+        "POST",
+        f"{BASE_URL}/text-to-speech/{voice_id}/stream",
+        headers={**_headers(), "Content-Type": "application/json"},
+        json={
+            "text": text,
+            "model_id": model_id,
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.75,
+                "style": 0.5,
+                "use_speaker_boost": True,
             },
-        )
+        },
+    ) as resp:
+        if resp.is_error:
+            await resp.aread()  # so the error body is available to the caller
         resp.raise_for_status()
 
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "wb") as f:
-            f.write(resp.content)
+        async with aiofiles.open(output_path, "wb") as f:
+            async for chunk in resp.aiter_bytes(STREAM_CHUNK_SIZE):
+                await f.write(chunk)
 
     return output_path
 
 
+async def text_to_speech_many(
+    jobs: list[dict],
+    on_done: Callable[[int], None] | None = None,
+) -> list[str]:
+    """Run text_to_speech for many segments concurrently.
+
+    Each job is a dict of text_to_speech keyword arguments. Up to
+    settings.elevenlabs_concurrency requests are in flight at once, but calls
+    for the same voice_id run one at a time in list order. on_done is called
+    with the number of finished segments after each one completes. If any
+    call fails, the others are cancelled and its exception is raised.
+    Returns the output paths in the same order as jobs.
+    """
+    semaphore = asyncio.Semaphore(settings.elevenlabs_concurrency)
+    voice_locks = {job["voice_id"]: asyncio.Lock() for job in jobs}
+    done = 0
+
+    async def _generate(job: dict) -> str:
+        nonlocal done
+        async with voice_locks[job["voice_id"]], semaphore:
+            path = await text_to_speech(**job)
+        done += 1
+        if on_done:
+            on_done(done)
+        return path
+
+    # TaskGroup cancels the remaining calls as soon as one fails, so nothing is
+    # left pending on the worker's reused event loop to run into the next job
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_generate(job)) for job in jobs]
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0]
+    return [task.result() for task in tasks]
+
+
 async def delete_voice(voice_id: str) -> None:
     """Delete a cloned voice to free up quota."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.delete(
-            f"{BASE_URL}/voices/{voice_id}",
-            headers=_headers(),
-        )
-        resp.raise_for_status()
+    client = _get_client()
+    resp = await client.delete(
+        f"{BASE_URL}/voices/{voice_id}",
+        headers=_headers(),
+    )
+    resp.raise_for_status()
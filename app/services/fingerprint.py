@@ -1,9 +1,13 @@
 import json
 import logging
+import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import numpy as np
+from sqlalchemy import func
 
 from app.database import SessionLocal
 from app.models import SpeakerProfile
@@ -12,6 +16,19 @@ logger = logging.getLogger(__name__)
 
 _encoder = None
 
+# Row-normalized embedding matrix of all stored profiles, rebuilt when the
+# profile table changes (checked via row count + newest created_at, which
+# also catches profiles created by other worker processes)
+_profile_lock = threading.Lock()
+_profile_version = None
+_profile_ids: list[str] = []
+_profile_matrix: np.ndarray | None = None
+_profile_index = None
+
+# Below this many profiles an exact scan of the matrix is as fast as an ANN index
+INDEX_MIN_PROFILES = 256
+HNSW_M = 32
+
 
 def _get_encoder():
     """Lazy-load the resemblyzer voice encoder."""
@@ -52,15 +69,116 @@ def compute_embedding(audio_path: str) -> list[float] | None:
         return None
 
 
-def _cosine_similarity(a: list[float], b: list[float]) -> float:
-    """Compute cosine similarity between two embedding vectors."""
-    a_arr = np.array(a)
-    b_arr = np.array(b)
-    dot = np.dot(a_arr, b_arr)
-    norm = np.linalg.norm(a_arr) * np.linalg.norm(b_arr)
-    if norm == 0:
-        return 0.0
-    return float(dot / norm)
+def compute_embeddings(audio_paths: list[str]) -> list[list[float] | None]:
+    """Compute speaker embeddings for several audio files at once.
+
+    Preprocessing runs in a thread pool, then the partial windows of every
+    file go through the encoder in a single batched forward pass (the same
+    windowing and averaging embed_utterance does per file). Falls back to
+    compute_embedding() per file if anything goes wrong.
+    """
+    if not audio_paths:
+        return []
+
+    encoder = _get_encoder()
+    if encoder is None:
+        return [None] * len(audio_paths)
+
+    try:
+        import torch
+        from resemblyzer import preprocess_wav
+        from resemblyzer.audio import wav_to_mel_spectrogram
+
+        workers = min(len(audio_paths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            wavs = list(pool.map(preprocess_wav, audio_paths))
+
+        mels = []
+        spans = []
+        for wav in wavs:
+            wav_slices, mel_slices = encoder.compute_partial_slices(len(wav), rate=1.3, min_coverage=0.75)
+            max_wave_length = wav_slices[-1].stop
+            if max_wave_length >= len(wav):
+                wav = np.pad(wav, (0, max_wave_length - len(wav)), "constant")
+            mel = wav_to_mel_spectrogram(wav)
+            start = len(mels)
+            mels.extend(mel[s] for s in mel_slices)
+            spans.append((start, len(mels)))
+
+        with torch.no_grad():
+            partials = encoder(torch.from_numpy(np.array(mels)).to(encoder.device)).cpu().numpy()
+
+        embeddings = []
+        for start, end in spans:
+            raw = partials[start:end].mean(axis=0)
+            embeddings.append((raw / np.linalg.norm(raw, 2)).tolist())
+        return embeddings
+    except Exception as e:
+        logger.warning(f"Batched embedding failed, computing one file at a time: {e}")
+        return [compute_embedding(path) for path in audio_paths]
+
+
+def _build_index(matrix: np.ndarray):
+    """Build an HNSW inner-product index over the normalized profile matrix.
+
+    Returns None if faiss is not installed or the matrix is small enough
+    that the exact scan is cheaper.
+    """
+    if len(matrix) < INDEX_MIN_PROFILES:
+        return None
+    try:
+        import faiss
+    except ImportError:
+        logger.warning("faiss not installed — using exact speaker profile scan")
+        return None
+
+    index = faiss.IndexHNSWFlat(matrix.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.add(np.ascontiguousarray(matrix))
+    return index
+
+
+def _encode_embedding(embedding: list[float]) -> bytes:
+    """Serialize an embedding as raw float32 bytes."""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _decode_embedding(blob: bytes | None, legacy_json: str | None) -> np.ndarray:
+    """Deserialize a stored embedding, falling back to the legacy JSON column."""
+    if blob is not None:
+        return np.frombuffer(blob, dtype=np.float32)
+    return np.asarray(json.loads(legacy_json), dtype=np.float32)
+
+
+def _load_profile_matrix(db) -> tuple[list[str], np.ndarray | None, object | None]:
+    """Return (profile ids, row-normalized float32 embedding matrix, ANN index or None),
+    cached across calls."""
+    global _profile_version, _profile_ids, _profile_matrix, _profile_index
+
+    version = tuple(db.query(func.count(SpeakerProfile.id), func.max(SpeakerProfile.created_at)).one())
+    with _profile_lock:
+        if version != _profile_version:
+            rows = db.query(
+                SpeakerProfile.id, SpeakerProfile.embedding_blob, SpeakerProfile.embedding_json
+            ).all()
+            ids = [profile_id for profile_id, _, _ in rows]
+            if rows:
+                matrix = np.stack([_decode_embedding(blob, legacy_json) for _, blob, legacy_json in rows])
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix /= norms
+            else:
+                matrix = None
+            index = _build_index(matrix) if matrix is not None else None
+            _profile_ids, _profile_matrix, _profile_index, _profile_version = ids, matrix, index, version
+            logger.info(f"Loaded {len(ids)} speaker profiles into the similarity matrix"
+                        + (" (HNSW index)" if index is not None else ""))
+        return _profile_ids, _profile_matrix, _profile_index
+
+
+def _invalidate_profile_matrix():
+    global _profile_version
+    with _profile_lock:
+        _profile_version = None
 
 
 def find_matching_profile(
@@ -68,32 +186,47 @@ def find_matching_profile(
 ) -> SpeakerProfile | None:
     """Search all stored speaker profiles for a cosine similarity match.
 
+    Scores every profile at once with a single matrix-vector product, or
+    queries an HNSW index once there are INDEX_MIN_PROFILES or more.
     Returns the best matching SpeakerProfile if similarity >= threshold, else None.
     """
+    query = np.asarray(embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm == 0:
+        return None
+
     db = SessionLocal()
     try:
-        profiles = db.query(SpeakerProfile).all()
-        best_match = None
-        best_score = 0.0
-
-        for profile in profiles:
-            stored_embedding = json.loads(profile.embedding_json)
-            score = _cosine_similarity(embedding, stored_embedding)
-            if score >= threshold and score > best_score:
-                best_score = score
-                best_match = profile
-
-        if best_match:
-            logger.info(f"Found matching speaker profile '{best_match.name}' "
-                        f"(similarity={best_score:.3f})")
-            # Update last_used_at
-            best_match.last_used_at = datetime.now(timezone.utc)
-            db.commit()
-            # Expunge so the object survives session close
-            db.expunge(best_match)
-            return best_match
+        ids, matrix, index = _load_profile_matrix(db)
+        if matrix is None:
+            return None
 
-        return None
+        query = query / query_norm
+        if index is not None:
+            scores, indices = index.search(query[None, :], 1)
+            best_idx = int(indices[0, 0])
+            best_score = float(scores[0, 0])
+            if best_idx < 0:
+                return None
+        else:
+            scores = matrix @ query
+            best_idx = int(scores.argmax())
+            best_score = float(scores[best_idx])
+        if best_score < threshold:
+            return None
+
+        best_match = db.get(SpeakerProfile, ids[best_idx])
+        if best_match is None:
+            return None
+
+        logger.info(f"Found matching speaker profile '{best_match.name}' "
+                    f"(similarity={best_score:.3f})")
+        # Update last_used_at
+        best_match.last_used_at = datetime.now(timezone.utc)
+        db.commit()
+        # Expunge so the object survives session close
+        db.expunge(best_match)
+        return best_match
     finally:
         db.close()
 
@@ -110,7 +243,7 @@ def create_profile(
         profile = SpeakerProfile(
             id=str(uuid.uuid4()),
             name=name,
-            embedding_json=json.dumps(embedding),
+            embedding_blob=_encode_embedding(embedding),
             elevenlabs_voice_id=voice_id,
             sample_file=sample_file,
             created_at=datetime.now(timezone.utc),
@@ -119,6 +252,7 @@ def create_profile(
         db.add(profile)
         db.commit()
         db.refresh(profile)
+        _invalidate_profile_matrix()
         logger.info(f"Created speaker profile '{name}' with voice_id={voice_id}")
         db.expunge(profile)
         return profile
@@ -1,8 +1,12 @@
 import asyncio
 import json
 import logging
+import os
+import random
+import time
 from pathlib import Path
 
+import aiofiles
 import httpx
 
 from app.config import settings
@@ -10,8 +14,13 @@ from app.config import settings
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://www.happyscribe.com/api/v1"
-POLL_INTERVAL = 10
-MAX_POLL_ATTEMPTS = 180
+# Polling backs off from POLL_INITIAL_DELAY by POLL_BACKOFF up to POLL_MAX_DELAY (plus jitter)
+POLL_INITIAL_DELAY = 2.0
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 30.0
+ORDER_TIMEOUT = 30 * 60
+EXPORT_TIMEOUT = 5 * 60
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 def _headers():
@@ -21,112 +30,165 @@ def _headers():
     }
 
 
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared client so successive calls (and poll loops) reuse keep-alive connections."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120, connect=10),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared client (called on worker shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def get_upload_url() -> dict:
     """Get a signed upload URL from HappyScribe."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(
-            f"{BASE_URL}/uploads/new",
-            headers=_headers(),
-        )
-        resp.raise_for_status()
-        return resp.json()
+    client = _get_client()
+    resp = await client.get(
+        f"{BASE_URL}/uploads/new",
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _iter_file(file_path: str):
+    """Yield a file in UPLOAD_CHUNK_SIZE chunks without blocking the event loop."""
+    async with aiofiles.open(file_path, "rb") as f:
+        while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
 
 
 async def upload_file(file_path: str) -> str:
-    """Upload file to HappyScribe's S3 and return the signed URL."""
+    """Upload file to HappyScribe's S3 and return the signed URL.
+    The file is streamed in chunks rather than read into memory."""
     upload_info = await get_upload_url()
     signed_url = upload_info["signedUrl"]
 
-    async with httpx.AsyncClient(timeout=120) as client:
-        with open(file_path, "rb") as f:
-            resp = await client.put(
-                signed_url,
-                content=f.read(),
-                headers={"Content-Type": "audio/mpeg"},
-            )
-            resp.raise_for_status()
+    client = _get_client()
+    resp = await client.put(
+        signed_url,
+        content=_iter_file(file_path),
+        # S3 signed PUTs need an explicit length (no chunked transfer encoding)
+        headers={
+            "Content-Type": "audio/mpeg",
+            "Content-Length": str(os.path.getsize(file_path)),
+        },
+    )
+    resp.raise_for_status()
 
     return signed_url
 
 
+async def _poll_sleep(resp: httpx.Response, delay: float) -> float:
+    """Wait before the next poll and return the delay to use after that.
+    Honors a numeric Retry-After header, otherwise sleeps delay plus up to 50% jitter."""
+    wait = None
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            pass  # HTTP-date form — fall back to our own backoff
+    if wait is None:
+        wait = delay + random.uniform(0, 0.5 * delay)
+    await asyncio.sleep(wait)
+    return min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+
+
 async def create_order(signed_url: str, language: str | None = None) -> str:
     """Create a transcription order. Language=None for auto-detect. Returns order ID."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        order_config = {
-            "service": "transcription",
-            "inputs": [{"url": signed_url}],
-        }
-        if language:
-            order_config["language"] = language
-        payload = {"order": order_config}
-        resp = await client.post(
-            f"{BASE_URL}/orders",
-            json=payload,
-            headers=_headers(),
-        )
-        resp.raise_for_status()
-        return resp.json()["id"]
+    client = _get_client()
+    order_config = {
+        "service": "transcription",
+        "inputs": [{"url": signed_url}],
+    }
+    if language:
+        order_config["language"] = language
+    payload = {"order": order_config}
+    resp = await client.post(
+        f"{BASE_URL}/orders",
+        json=payload,
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+    return resp.json()["id"]
 
 
 async def poll_order(order_id: str) -> dict:
     """Poll until transcription order completes."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        for _ in range(MAX_POLL_ATTEMPTS):
-            resp = await client.get(
-                f"{BASE_URL}/orders/{order_id}",
-                headers=_headers(),
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            state = data.get("state", "")
+    client = _get_client()
+    delay = POLL_INITIAL_DELAY
+    deadline = time.monotonic() + ORDER_TIMEOUT
+    while time.monotonic() < deadline:
+        resp = await client.get(
+            f"{BASE_URL}/orders/{order_id}",
+            headers=_headers(),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        state = data.get("state", "")
 
-            if state == "finished":
-                return data
-            elif state in ("failed", "expired"):
-                raise RuntimeError(f"HappyScribe order failed: {state}")
+        if state == "finished":
+            return data
+        elif state in ("failed", "expired"):
+            raise RuntimeError(f"HappyScribe order failed: {state}")
 
-            logger.info(f"HappyScribe order {order_id}: {state}")
-            await asyncio.sleep(POLL_INTERVAL)
+        logger.info(f"HappyScribe order {order_id}: {state}")
+        delay = await _poll_sleep(resp, delay)
 
     raise TimeoutError(f"HappyScribe order {order_id} timed out")
 
 
 async def export_transcript(transcription_id: str) -> dict:
     """Export transcript as JSON with speaker labels and timestamps."""
-    async with httpx.AsyncClient(timeout=60) as client:
-        # Create export
-        resp = await client.post(
-            f"{BASE_URL}/exports",
-            json={
-                "export": {
-                    "transcription_id": transcription_id,
-                    "format": "json",
-                    "show_speaker": True,
-                    "show_timestamps": True,
-                }
-            },
+    client = _get_client()
+    # Create export
+    resp = await client.post(
+        f"{BASE_URL}/exports",
+        json={
+            "export": {
+                "transcription_id": transcription_id,
+                "format": "json",
+                "show_speaker": True,
+                "show_timestamps": True,
+            }
+        },
+        headers=_headers(),
+    )
+    resp.raise_for_status()
+    export_data = resp.json()
+    export_id = export_data["id"]
+
+    # Poll for export
+    delay = POLL_INITIAL_DELAY
+    deadline = time.monotonic() + EXPORT_TIMEOUT
+    while time.monotonic() < deadline:
+        resp = await client.get(
+            f"{BASE_URL}/exports/{export_id}",
             headers=_headers(),
         )
         resp.raise_for_status()
-        export_data = resp.json()
-        export_id = export_data["id"]
-
-        # Poll for export
-        for _ in range(60):
-            resp = await client.get(
-                f"{BASE_URL}/exports/{export_id}",
-                headers=_headers(),
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        data = resp.json()
 
-            if data.get("state") == "ready" and data.get("download_link"):
-                # Download the export
-                resp = await client.get(data["download_link"])
-                resp.raise_for_status()
-                return resp.json()
+        if data.get("state") == "ready" and data.get("download_link"):
+            # Download the export
+            resp = await client.get(data["download_link"])
+            resp.raise_for_status()
+            return resp.json()
 
-            await asyncio.sleep(5)
+        delay = await _poll_sleep(resp, delay)
 
     raise TimeoutError("HappyScribe export timed out")
 
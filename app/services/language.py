@@ -1,12 +1,16 @@
 import logging
 from collections import Counter
+from functools import lru_cache
 
 from langdetect import detect, detect_langs, LangDetectException
 
-from app.config import SUPPORTED_LANGUAGES
+from app.config import SUPPORTED_LANGUAGES, BASE_DIR, settings
 
 logger = logging.getLogger(__name__)
 
+_fasttext_model = None
+_fasttext_unavailable = False
+
 # Map langdetect codes to our internal codes
 _LANGDETECT_MAP = {lang["code"]: lang for lang in SUPPORTED_LANGUAGES}
 # langdetect uses some different codes
@@ -18,35 +22,121 @@ _CODE_ALIASES = {
     "sw": "sw",
 }
 
+# Every code langdetect's bundled profiles can return
+_LANGDETECT_CODES = (
+    "af", "ar", "bg", "bn", "ca", "cs", "cy", "da", "de", "el", "en", "es", "et", "fa",
+    "fi", "fr", "gu", "he", "hi", "hr", "hu", "id", "it", "ja", "kn", "ko", "lt", "lv",
+    "mk", "ml", "mr", "ne", "nl", "no", "pa", "pl", "pt", "ro", "ru", "sk", "sl", "so",
+    "sq", "sv", "sw", "ta", "te", "th", "tl", "tr", "uk", "ur", "vi", "zh-cn", "zh-tw",
+)
 
-def _normalize_code(code: str) -> str:
-    """Normalize a langdetect code to our internal code."""
+# Shorter texts are too unreliable for langdetect to be worth scoring
+MIN_DETECT_CHARS = 8
+
+_UNKNOWN = {"code": "unknown", "name": "Unknown", "confidence": 0.0}
+
+
+def _normalize_code_slow(code: str) -> str:
     code = code.lower().split("-")[0] if "-" not in _CODE_ALIASES.get(code.lower(), "") else code.lower()
     return _CODE_ALIASES.get(code, code)
 
 
-def detect_segment_language(text: str) -> dict:
-    """Detect the language of a text segment.
-    Returns {"code": "en", "name": "English", "confidence": 0.99}."""
-    if not text or not text.strip():
-        return {"code": "unknown", "name": "Unknown", "confidence": 0.0}
+_NORMALIZED_CODES = {code: _normalize_code_slow(code) for code in _LANGDETECT_CODES}
+
+
+def _normalize_code(code: str) -> str:
+    """Normalize a langdetect code to our internal code."""
+    normalized = _NORMALIZED_CODES.get(code)
+    return normalized if normalized is not None else _normalize_code_slow(code)
+
 
+def _get_fasttext_model():
+    """Lazy-load the fastText lid.176 language-ID model from settings.langid_model_path.
+    The model is provisioned ahead of time (see README), never downloaded by a worker.
+    Returns None if fasttext or the model file is unavailable, in which case langdetect is used."""
+    global _fasttext_model, _fasttext_unavailable
+    if _fasttext_model is not None or _fasttext_unavailable:
+        return _fasttext_model
+
+    try:
+        import fasttext
+
+        model_path = BASE_DIR / settings.langid_model_path
+        if not model_path.exists():
+            logger.warning(f"fastText language-ID model not found at {model_path} — using langdetect")
+            _fasttext_unavailable = True
+            return None
+
+        _fasttext_model = fasttext.load_model(str(model_path))
+        logger.info("fastText language-ID model loaded")
+    except ImportError:
+        logger.warning("fasttext not installed — using langdetect for language detection")
+        _fasttext_unavailable = True
+    except Exception as e:
+        logger.warning(f"Failed to load fastText language-ID model, using langdetect: {e}")
+        _fasttext_unavailable = True
+    return _fasttext_model
+
+
+def _predict_fasttext(text: str) -> tuple[str, float] | None:
+    """Top (language code, probability) from fastText, or None to fall back to langdetect."""
+    global _fasttext_model, _fasttext_unavailable
+    model = _get_fasttext_model()
+    if model is None:
+        return None
+    try:
+        # Call the C++ binding directly: the Python predict() wrapper uses
+        # np.array(copy=False), which raises under NumPy 2
+        predictions = model.f.predict(text.replace("\n", " ") + "\n", 1, 0.0, "strict")
+    except Exception as e:
+        logger.warning(f"fastText prediction failed, switching to langdetect: {e}")
+        _fasttext_model = None
+        _fasttext_unavailable = True
+        return None
+    if not predictions:
+        return None
+    prob, label = predictions[0]
+    return label.replace("__label__", ""), float(prob)
+
+
+def _predict_langdetect(text: str) -> tuple[str, float] | None:
     try:
         results = detect_langs(text)
-        if not results:
-            return {"code": "unknown", "name": "Unknown", "confidence": 0.0}
+    except LangDetectException:
+        return None
+    if not results:
+        return None
+    return results[0].lang, results[0].prob
 
-        top = results[0]
-        code = _normalize_code(top.lang)
-        lang = _LANGDETECT_MAP.get(code)
 
-        return {
-            "code": code,
-            "name": lang["name"] if lang else code.upper(),
-            "confidence": round(top.prob, 3),
-        }
-    except LangDetectException:
-        return {"code": "unknown", "name": "Unknown", "confidence": 0.0}
+@lru_cache(maxsize=8192)
+def _detect_cached(text: str) -> dict:
+    """Detect the language of already-stripped text. Memoized: podcasts repeat short phrases a lot."""
+    if len(text) < MIN_DETECT_CHARS:
+        return _UNKNOWN
+
+    prediction = _predict_fasttext(text) or _predict_langdetect(text)
+    if prediction is None:
+        return _UNKNOWN
+
+    raw_code, prob = prediction
+    code = _normalize_code(raw_code)
+    lang = _LANGDETECT_MAP.get(code)
+
+    return {
+        "code": code,
+        "name": lang["name"] if lang else code.upper(),
+        "confidence": round(prob, 3),
+    }
+
+
+def detect_segment_language(text: str) -> dict:
+    """Detect the language of a text segment.
+    Returns {"code": "en", "name": "English", "confidence": 0.99}."""
+    if not text:
+        return dict(_UNKNOWN)
+    # Copy so callers never mutate the cached result
+    return dict(_detect_cached(text.strip()))
 
 
 def detect_segments_languages(segments: list[dict]) -> list[dict]:
@@ -1,13 +1,20 @@
 import logging
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-from faster_whisper import WhisperModel
+import numpy as np
 
-from app.config import settings
+from app.config import settings, cpu_threads_per_worker
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
 
 logger = logging.getLogger(__name__)
 
 _model = None
 
+WHISPER_SAMPLE_RATE = 16000
+
 # Model RAM requirements (approximate, int8):
 # tiny: ~75MB  | base: ~150MB | small: ~500MB | medium: ~1.5GB | large-v3: ~3GB
 _MODEL_SIZES = {
@@ -19,56 +26,142 @@ _MODEL_SIZES = {
 }
 
 
-def _get_model() -> WhisperModel:
-    """Lazy-load the Whisper model (downloaded on first use)."""
+def _get_model() -> "WhisperModel":
+    """Lazy-load the Whisper model (downloaded on first use).
+    faster_whisper itself is imported here so worker processes that never
+    transcribe don't pay for loading CTranslate2."""
     global _model
     if _model is None:
+        from faster_whisper import WhisperModel
+
         model_name = settings.whisper_model
         size_info = _MODEL_SIZES.get(model_name, "unknown size")
         logger.info(f"Loading Whisper model ({model_name}, {size_info}) — first run downloads the model")
-        _model = WhisperModel(model_name, device="cpu", compute_type="int8")
+        _model = WhisperModel(
+            model_name,
+            device="cpu",
+            compute_type=settings.whisper_compute_type,
+            cpu_threads=settings.whisper_cpu_threads or cpu_threads_per_worker(),
+            num_workers=1,
+        )
         logger.info(f"Whisper model ({model_name}) loaded")
     return _model
 
 
-def transcribe(file_path: str, diarization_segments: list[dict] | None = None) -> list[dict]:
+def _load_audio(file_path: str) -> np.ndarray | str:
+    """Read a WAV file (the separated vocals stem) into the 16 kHz mono float32
+    array Whisper expects.
+
+    Each block is downmixed and streamed through a soxr resampler as it is
+    read, into one preallocated 16 kHz buffer, so only the final array (plus
+    one block) is ever held. Other formats, or a WAV that cannot be read, are
+    returned as the path so faster-whisper decodes them itself.
+    """
+    if not file_path.lower().endswith(".wav"):
+        return file_path
+    try:
+        import soundfile as sf
+        import soxr
+
+        with sf.SoundFile(file_path) as f:
+            sample_rate = f.samplerate
+            resampler = None
+            if sample_rate != WHISPER_SAMPLE_RATE:
+                resampler = soxr.ResampleStream(sample_rate, WHISPER_SAMPLE_RATE, 1, dtype="float32")
+
+            # One second of slack for the resampler's rounding at the end
+            expected = f.frames * WHISPER_SAMPLE_RATE // sample_rate + WHISPER_SAMPLE_RATE
+            audio = np.empty(expected, dtype=np.float32)
+            pos = 0
+            blocks = f.blocks(blocksize=sample_rate * 60, dtype="float32", always_2d=True)
+            for block in blocks:
+                mono = block.mean(axis=1)
+                if resampler is not None:
+                    mono = resampler.resample_chunk(mono)
+                audio[pos:pos + len(mono)] = mono
+                pos += len(mono)
+            if resampler is not None:
+                tail = resampler.resample_chunk(np.empty(0, dtype=np.float32), last=True)
+                audio[pos:pos + len(tail)] = tail
+                pos += len(tail)
+
+        return audio[:pos]
+    except Exception as e:
+        logger.warning(f"Could not pre-load {file_path} for Whisper, letting it decode the file: {e}")
+        return file_path
+
+
+def transcribe(
+    file_path: str, diarization_segments: list[dict] | Future | None = None
+) -> list[dict]:
     """Transcribe an audio file using Whisper locally.
     Returns a list of segments with speaker, text, start_time, end_time.
 
     If diarization_segments is provided (from pyannote), each Whisper segment
     is assigned the pyannote speaker with maximum time overlap.
-    Otherwise falls back to gap-based speaker detection."""
-    model = _get_model()
+    Otherwise falls back to gap-based speaker detection.
 
-    segments_iter, info = model.transcribe(
-        file_path,
-        beam_size=5,
+    diarization_segments may also be a Future for a diarization still running
+    in another thread: Whisper then decodes in the meantime and speakers are
+    assigned once it resolves."""
+    model = _get_model()
+    options = dict(
+        beam_size=settings.whisper_beam_size,
         vad_filter=True,
         vad_parameters=dict(min_silence_duration_ms=500),
+        word_timestamps=False,
+        without_timestamps=False,
     )
 
+    if settings.whisper_batch_size > 1:
+        from faster_whisper import BatchedInferencePipeline
+
+        # Decode several VAD speech chunks per forward pass
+        pipeline = BatchedInferencePipeline(model=model)
+        segments_iter, info = pipeline.transcribe(
+            _load_audio(file_path), batch_size=settings.whisper_batch_size, **options
+        )
+    else:
+        segments_iter, info = model.transcribe(_load_audio(file_path), **options)
+
     logger.info(f"Detected language: {info.language} (probability {info.language_probability:.2f})")
 
-    raw_segments = list(segments_iter)
+    if isinstance(diarization_segments, Future):
+        segments_iter = list(segments_iter)  # decode while diarization finishes
+        diarization_segments = diarization_segments.result()
 
+    # Assign speakers as Whisper decodes instead of materializing its raw segments first
     if diarization_segments:
-        result = _assign_speakers_from_diarization(raw_segments, diarization_segments)
+        result = list(_assign_speakers_from_diarization(segments_iter, diarization_segments))
     else:
-        result = _assign_speakers_gap_based(raw_segments)
+        result = list(_assign_speakers_gap_based(segments_iter))
 
     logger.info(f"Transcription complete: {len(result)} segments")
     return result
 
 
 def _assign_speakers_from_diarization(
-    whisper_segments: list, diarization_segments: list[dict]
-) -> list[dict]:
+    whisper_segments: Iterable, diarization_segments: list[dict]
+) -> Iterator[dict]:
     """Assign speaker labels by finding the pyannote segment with maximum time overlap."""
     # Build a mapping of unique pyannote speaker IDs to friendly names
     unique_speakers = sorted(set(s["speaker"] for s in diarization_segments))
     speaker_names = {spk: f"Speaker {i + 1}" for i, spk in enumerate(unique_speakers)}
 
-    result = []
+    # Diarization turns as arrays sorted by start, so each overlap search only
+    # looks at the few turns that can intersect the segment
+    starts = np.array([s["start"] for s in diarization_segments], dtype=np.float64)
+    order = np.argsort(starts, kind="stable")
+    diar_starts = starts[order]
+    diar_ends = np.array([s["end"] for s in diarization_segments], dtype=np.float64)[order]
+    # Friendly label per turn, so the per-segment lookup is a list index
+    diar_labels = [speaker_names[spk] if spk else "Speaker 1"
+                   for spk in (diarization_segments[i]["speaker"] for i in order)]
+    # Running max of turn ends: every turn before the first index where this
+    # exceeds seg_start has already ended by then
+    max_ends = np.maximum.accumulate(diar_ends)
+    searchsorted = np.searchsorted
+
     for seg in whisper_segments:
         text = seg.text.strip()
         if not text:
@@ -77,35 +170,29 @@ def _assign_speakers_from_diarization(
         seg_start = seg.start
         seg_end = seg.end
 
-        # Find the diarization segment with maximum overlap
-        best_speaker = None
-        best_overlap = 0.0
-
-        for diar_seg in diarization_segments:
-            overlap_start = max(seg_start, diar_seg["start"])
-            overlap_end = min(seg_end, diar_seg["end"])
-            overlap = max(0.0, overlap_end - overlap_start)
-
-            if overlap > best_overlap:
-                best_overlap = overlap
-                best_speaker = diar_seg["speaker"]
-
-        speaker_label = speaker_names.get(best_speaker, "Speaker 1") if best_speaker else "Speaker 1"
-
-        result.append({
+        # Find the diarization segment with maximum overlap among the turns
+        # that start before seg_end and end after seg_start
+        speaker_label = "Speaker 1"
+        lo = int(searchsorted(max_ends, seg_start, side="right"))
+        hi = int(searchsorted(diar_starts, seg_end, side="left"))
+        if lo < hi:
+            overlaps = np.minimum(seg_end, diar_ends[lo:hi]) - np.maximum(seg_start, diar_starts[lo:hi])
+            best_idx = int(overlaps.argmax())
+            if overlaps[best_idx] > 0:
+                speaker_label = diar_labels[lo + best_idx]
+
+        yield {
             "speaker": speaker_label,
             "text": text,
             "start_time": round(seg_start, 2),
             "end_time": round(seg_end, 2),
-        })
-
-    return result
+        }
 
 
-def _assign_speakers_gap_based(whisper_segments: list) -> list[dict]:
+def _assign_speakers_gap_based(whisper_segments: Iterable) -> Iterator[dict]:
     """Fallback: basic speaker change detection based on pauses > 2 seconds."""
-    result = []
-    current_speaker = 1
+    labels = ("Speaker 1", "Speaker 2")
+    current = 0
     prev_end = 0.0
 
     for seg in whisper_segments:
@@ -113,17 +200,17 @@ def _assign_speakers_gap_based(whisper_segments: list) -> list[dict]:
         if not text:
             continue
 
+        seg_start = seg.start
+        seg_end = seg.end
+
         # If there's a gap > 2 seconds, assume speaker change
-        gap = seg.start - prev_end
-        if gap > 2.0 and prev_end > 0:
-            current_speaker = (current_speaker % 2) + 1  # Toggle between Speaker 1 and 2
+        if seg_start - prev_end > 2.0 and prev_end > 0:
+            current ^= 1  # Toggle between Speaker 1 and 2
 
-        result.append({
-            "speaker": f"Speaker {current_speaker}",
+        yield {
+            "speaker": labels[current],
             "text": text,
-            "start_time": round(seg.start, 2),
-            "end_time": round(seg.end, 2),
-        })
-        prev_end = seg.end
-
-    return result
+            "start_time": round(seg_start, 2),
+            "end_time": round(seg_end, 2),
+        }
+        prev_end = seg_end